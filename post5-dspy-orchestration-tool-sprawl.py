@@ -1,9 +1,23 @@
+import asyncio
 import dspy
 import json
-from typing import List, Dict, Any
+import re
+import functools
+import hashlib
+import threading
+import weakref
+from bisect import bisect_right
+from typing import List, Dict, Any, Optional, Callable
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
+import faiss
+import httpx
+import litellm
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
 # ============================================================================
 # SETUP: Configure DSPy with your LLM
 # ============================================================================
@@ -17,6 +31,43 @@ from dataclasses import dataclass
 # Option 3: Local/Ollama
 # dspy.settings.configure(lm=dspy.LM("ollama/llama3.1", api_base="http://localhost:11434"))
 
+# Optional: serve the planner from a cheaper model; the agents keep the main LM
+PLANNER_LM = None  # e.g. dspy.LM("openai/gpt-4o-mini")
+
+# Pin one pooled keep-alive HTTP/2 client for sync LM calls; litellm (under dspy.LM) reuses
+# it instead of setting up a connection per call. All LM calls here are sync (asyncify runs
+# them in threads), and a module-level AsyncClient would bind to whichever loop used it first.
+# Only litellm's OpenAI and Azure handlers read client_session; other providers (Anthropic,
+# Ollama, ...) build their own clients, so the pool and the warm-up below do not apply to them
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+litellm.client_session = httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=30)
+
+CLIENT_SESSION_PROVIDERS = {"openai", "azure"}
+DEFAULT_API_BASES = {
+    "openai": "https://api.openai.com/v1",
+}
+
+def warm_up_lm_connection():
+    """Pay the TCP + TLS handshake at startup rather than on the first query."""
+    lm = dspy.settings.lm
+    if lm is None:
+        return
+    
+    provider = lm.model.split("/", 1)[0]
+    if provider not in CLIENT_SESSION_PROVIDERS:
+        return
+    api_base = lm.kwargs.get("api_base") or DEFAULT_API_BASES.get(provider)
+    if not api_base:
+        return
+    
+    try:
+        # Any response (even 401) means the pooled connection is open
+        litellm.client_session.get(f"{api_base.rstrip('/')}/models")
+    except httpx.HTTPError as e:
+        print(f"⚠️  LM connection warmup failed: {e}")
+
+warm_up_lm_connection()
+
 print("✓ DSPy configured")
 #
 # ============================================================================
@@ -111,27 +162,344 @@ ANALYTICS_DATA = {
     }
 }
 
+# ============================================================================
+# SEARCH INDEX: Built once at import
+# ============================================================================
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+def _build_index(records: Dict[str, Dict[str, Any]], fields: List[str]):
+    """Build a token -> record-id inverted index and (record_id, lowercased haystack) rows.
+    
+    Fields are joined with newlines so a substring match cannot span two fields.
+    """
+    index: Dict[str, set] = {}
+    rows: List[tuple] = []
+    for record_id, record in records.items():
+        haystack = "\n".join(record[f] for f in fields).lower()
+        rows.append((record_id, haystack))
+        for token in _tokenize(haystack):
+            index.setdefault(token, set()).add(record_id)
+    return index, rows
+
+def _flatten_rows(rows: List[tuple]):
+    """Concatenate row haystacks into one NUL-separated buffer plus each row's start offset."""
+    starts, offset = [], 0
+    for _, hay in rows:
+        starts.append(offset)
+        offset += len(hay) + 1
+    return "\x00".join(hay for _, hay in rows), starts
+
+def _scan_rows(corpus: tuple, needle: str) -> List[int]:
+    """Return indices of rows containing needle, scanning the flat buffer with str.find.
+    
+    str.find runs CPython's Horspool-style fastsearch in C, so the scan visits each
+    matching row once instead of paying interpreter overhead per row.
+    """
+    text, starts = corpus
+    if not needle:
+        return list(range(len(starts)))
+    if "\x00" in needle:
+        return []
+    
+    matches = []
+    pos = text.find(needle)
+    while pos != -1:
+        row = bisect_right(starts, pos) - 1
+        matches.append(row)
+        if row + 1 == len(starts):
+            break
+        pos = text.find(needle, starts[row + 1])
+    return matches
+
+def _token_hits(index: Dict[str, set], query_lower: str) -> set:
+    """Ids of records containing every query token, in any order.
+    
+    Single-token queries return an empty set so callers take the substring scan,
+    which also finds the word inside longer ones ("web" in "webhook").
+    """
+    q_tokens = _tokenize(query_lower)
+    if len(q_tokens) < 2:
+        return set()
+    return set.intersection(*[index.get(t, set()) for t in q_tokens])
+
+def _lookup(index: Dict[str, set], rows: List[tuple], corpus: tuple, query: str) -> List[str]:
+    """Return matching record ids (in insertion order) for a keyword query."""
+    query_lower = query.lower()
+    hits = _token_hits(index, query_lower)
+    
+    # Substring matching for single words, partial words ("saf") and other misses
+    if not hits:
+        return [rows[row][0] for row in _scan_rows(corpus, query_lower)]
+    
+    return [record_id for record_id, _ in rows if record_id in hits]
+
+# Field name -> accepted type(s), checked by the setters before any store is touched
+JIRA_FIELDS = dict.fromkeys(["title", "status", "assignee", "priority", "description", "created", "updated"], str)
+CONFLUENCE_FIELDS = dict.fromkeys(["title", "content", "updated"], str)
+METRIC_FIELDS = {
+    "current": (int, float),
+    "previous": (int, float),
+    "trend": str,
+    "change_pct": (int, float),
+    "period": str,
+}
+
+def _build_jira_store():
+    """(Re)build every index, array and display string derived from JIRA_TICKETS."""
+    global JIRA_INDEX, TICKET_IDS, TITLES, DESCRIPTIONS, PRIORITIES, STATUSES, ASSIGNEES
+    global CREATED, UPDATED, TICKET_ID_TO_IDX, _JIRA_SEARCH_FIELDS, _JIRA_RESULT_LINES
+    global _TICKET_DETAIL_CACHE
+    
+    JIRA_INDEX, _ = _build_index(
+        JIRA_TICKETS, ["title", "description", "priority", "status", "assignee"]
+    )
+    
+    # Jira tickets as parallel arrays (structure-of-arrays): one contiguous array per field
+    TICKET_IDS = np.array(list(JIRA_TICKETS))
+    TITLES = np.array([t["title"] for t in JIRA_TICKETS.values()])
+    DESCRIPTIONS = np.array([t["description"] for t in JIRA_TICKETS.values()])
+    PRIORITIES = np.array([t["priority"] for t in JIRA_TICKETS.values()])
+    STATUSES = np.array([t["status"] for t in JIRA_TICKETS.values()])
+    ASSIGNEES = np.array([t["assignee"] for t in JIRA_TICKETS.values()])
+    CREATED = np.array([t["created"] for t in JIRA_TICKETS.values()])
+    UPDATED = np.array([t["updated"] for t in JIRA_TICKETS.values()])
+    TICKET_ID_TO_IDX = {str(ticket_id): i for i, ticket_id in enumerate(TICKET_IDS)}
+    
+    _JIRA_SEARCH_FIELDS = [
+        np.char.lower(field) for field in (TITLES, DESCRIPTIONS, PRIORITIES, STATUSES, ASSIGNEES)
+    ]
+    
+    # Search hits and ticket details are formatted once here, so tools only do lookups
+    _JIRA_RESULT_LINES = [
+        f"{TICKET_IDS[i]}: {TITLES[i]} "
+        f"(Status: {STATUSES[i]}, Priority: {PRIORITIES[i]}, Assignee: {ASSIGNEES[i]})"
+        for i in range(len(TICKET_IDS))
+    ]
+    _TICKET_DETAIL_CACHE = {
+        str(TICKET_IDS[i]): f"""Ticket {TICKET_IDS[i]}: {TITLES[i]}
+Status: {STATUSES[i]}
+Assignee: {ASSIGNEES[i]}
+Priority: {PRIORITIES[i]}
+Created: {CREATED[i]}
+Updated: {UPDATED[i]}
+
+Description:
+{DESCRIPTIONS[i]}"""
+        for i in range(len(TICKET_IDS))
+    }
+
+def _build_confluence_store():
+    """(Re)build the index, flat corpus and display strings derived from CONFLUENCE_DOCS."""
+    global CONFLUENCE_INDEX, _CONFLUENCE_SEARCH_ROWS, _CONFLUENCE_CORPUS
+    global _CONFLUENCE_RESULT_LINES, _DOC_DETAIL_CACHE, _DOC_KEYS_CSV
+    
+    CONFLUENCE_INDEX, _CONFLUENCE_SEARCH_ROWS = _build_index(CONFLUENCE_DOCS, ["title", "content"])
+    _CONFLUENCE_CORPUS = _flatten_rows(_CONFLUENCE_SEARCH_ROWS)
+    
+    _CONFLUENCE_RESULT_LINES = {
+        doc_id: f"• {doc['title']} (Key: {doc_id}, Updated: {doc['updated']})"
+        for doc_id, doc in CONFLUENCE_DOCS.items()
+    }
+    _DOC_DETAIL_CACHE = {
+        doc_key: f"""{doc['title']}
+Last updated: {doc['updated']}
+
+Content:
+{doc['content']}"""
+        for doc_key, doc in CONFLUENCE_DOCS.items()
+    }
+    _DOC_KEYS_CSV = ', '.join(CONFLUENCE_DOCS.keys())
+
+def _build_metric_store():
+    """(Re)build the display strings and value arrays derived from ANALYTICS_DATA."""
+    global _METRIC_FORMATTED, _METRIC_SUMMARY, _METRIC_NAMES_CSV, _METRICS_LIST_STR
+    global _METRIC_NAMES, _CURRENT, _PREVIOUS
+    
+    # Metric values as parallel arrays for vectorized multi-metric analysis
+    _METRIC_NAMES = np.array(list(ANALYTICS_DATA))
+    _CURRENT = np.array([m["current"] for m in ANALYTICS_DATA.values()], dtype=np.float32)
+    _PREVIOUS = np.array([m["previous"] for m in ANALYTICS_DATA.values()], dtype=np.float32)
+    
+    _METRIC_FORMATTED = {
+        name: f"""{name}:
+Current: {metric['current']}
+Previous: {metric['previous']}
+Trend: {metric['trend']} ({metric['change_pct']:+.1f}%)
+Period: {metric['period']}"""
+        for name, metric in ANALYTICS_DATA.items()
+    }
+    # "current (trend ±pct%)", shared by the comparison and listing tools
+    _METRIC_SUMMARY = {
+        name: f"{metric['current']} ({metric['trend']} {metric['change_pct']:+.1f}%)"
+        for name, metric in ANALYTICS_DATA.items()
+    }
+    _METRIC_NAMES_CSV = ', '.join(ANALYTICS_DATA.keys())
+    _METRICS_LIST_STR = "\n".join(
+        ["Available metrics:"] + [f"• {name}: {summary}" for name, summary in _METRIC_SUMMARY.items()]
+    )
+
+_build_jira_store()
+_build_confluence_store()
+_build_metric_store()
+
+def _scan_jira(query_lower: str) -> np.ndarray:
+    """Row indices of tickets with a field containing query_lower, as one vectorized mask."""
+    mask = np.zeros(len(TICKET_IDS), dtype=bool)
+    for field in _JIRA_SEARCH_FIELDS:
+        mask |= np.char.find(field, query_lower) >= 0
+    return np.nonzero(mask)[0]
+
+# ============================================================================
+# SEMANTIC INDEX: Embedded once at startup
+# ============================================================================
+
+EMBEDDING_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
+EMBEDDING_DIM = EMBEDDING_MODEL.get_sentence_embedding_dimension()  # 384
+EMBEDDING_CACHE_DIR = ".embedding_cache"
+
+def _embed_cached(texts: List[str]) -> np.ndarray:
+    """Embed texts, reusing on-disk vectors keyed by the sha256 of each text."""
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    paths = [
+        os.path.join(EMBEDDING_CACHE_DIR, hashlib.sha256(t.encode()).hexdigest() + ".npy")
+        for t in texts
+    ]
+    missing = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+    
+    if missing:
+        fresh = EMBEDDING_MODEL.encode([texts[i] for i in missing], normalize_embeddings=True)
+        for i, emb in zip(missing, fresh):
+            np.save(paths[i], emb.astype(np.float32))
+    
+    return np.stack([np.load(path) for path in paths]).astype(np.float32)
+
+# Past this size a flat FP32 index (4·D bytes per vector) gets heavy, so switch to
+# IVF + product quantization: PQ_M bytes per vector, searched over IVF_NPROBE of IVF_NLIST cells
+IVF_NLIST = 64
+PQ_M = 32  # sub-quantizers; must divide EMBEDDING_DIM
+PQ_NBITS = 8
+IVF_NPROBE = 8
+IVFPQ_MIN_VECTORS = 39 * 2 ** PQ_NBITS  # faiss wants ~39 training points per PQ centroid
+
+_SEMANTIC_INDEX_PATH = None  # file backing the current IVFPQ index, replaced on every save
+
+def _save_vector_index(index: faiss.Index, corpus_key: str):
+    """Persist the index under its corpus key and delete the file it supersedes."""
+    global _SEMANTIC_INDEX_PATH
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"corpus-{corpus_key}.faiss")
+    faiss.write_index(index, path)
+    if _SEMANTIC_INDEX_PATH not in (None, path) and os.path.exists(_SEMANTIC_INDEX_PATH):
+        os.remove(_SEMANTIC_INDEX_PATH)
+    _SEMANTIC_INDEX_PATH = path
+
+def _build_vector_index(embs: np.ndarray, corpus_key: str) -> faiss.Index:
+    """Flat inner-product index for small corpora; a trained, disk-persisted IVFPQ index otherwise."""
+    global _SEMANTIC_INDEX_PATH
+    if len(embs) < IVFPQ_MIN_VECTORS:
+        index = faiss.IndexFlatIP(EMBEDDING_DIM)
+        index.add(embs)
+        return index
+    
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"corpus-{corpus_key}.faiss")
+    if os.path.exists(path):
+        index = faiss.read_index(path)
+        _SEMANTIC_INDEX_PATH = path
+    else:
+        quantizer = faiss.IndexFlatIP(EMBEDDING_DIM)
+        index = faiss.IndexIVFPQ(
+            quantizer, EMBEDDING_DIM, IVF_NLIST, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(embs)
+        index.add(embs)
+        _save_vector_index(index, corpus_key)
+    
+    index.nprobe = IVF_NPROBE
+    return index
+
+def _update_vector_index(index: faiss.IndexIVF, old_texts: List[str], texts: List[str], corpus_key: str):
+    """Re-add only changed and new vectors under their ids, keeping the trained centroids."""
+    changed = [i for i, text in enumerate(texts) if i >= len(old_texts) or text != old_texts[i]]
+    if not changed:
+        return
+    
+    embs = _embed_cached([texts[i] for i in changed])
+    ids = np.array(changed, dtype=np.int64)
+    index.remove_ids(ids)  # no-op for ids that are new
+    index.add_with_ids(embs, ids)
+    _save_vector_index(index, corpus_key)
+
+# (source, key) -> vector id, assigned on first sight so ids stay stable as records are added
+_SEMANTIC_IDS: Dict[tuple, int] = {}
+SEMANTIC_TEXTS: List[str] = []
+SEMANTIC_INDEX = None
+
+def _build_semantic_index():
+    """(Re)embed tickets and docs; unchanged texts are served from the on-disk cache.
+    
+    Once the corpus runs on a trained IVFPQ index, edits update it in place instead of
+    retraining k-means over every vector; the centroids keep the original training set.
+    """
+    global SEMANTIC_ITEMS, SEMANTIC_TEXTS, SEMANTIC_INDEX
+    
+    # Each entry maps to the display line returned for a semantic hit and the text embedded
+    entries = {
+        ("jira", ticket_id): (
+            f"[Jira] {ticket_id}: {ticket['title']} (Status: {ticket['status']}, Priority: {ticket['priority']})",
+            f"{ticket['title']}. {ticket['description']}",
+        )
+        for ticket_id, ticket in JIRA_TICKETS.items()
+    }
+    entries.update({
+        ("confluence", doc_id): (
+            f"[Confluence] {doc['title']} (Key: {doc_id}, Updated: {doc['updated']})",
+            f"{doc['title']}. {doc['content']}",
+        )
+        for doc_id, doc in CONFLUENCE_DOCS.items()
+    })
+    
+    ids = dict(_SEMANTIC_IDS)
+    for key in entries:
+        ids.setdefault(key, len(ids))
+    items, texts = [None] * len(ids), [None] * len(ids)
+    for key, (item, text) in entries.items():
+        items[ids[key]], texts[ids[key]] = item, text
+    
+    corpus_key = hashlib.sha256("\x00".join(texts).encode()).hexdigest()
+    if isinstance(SEMANTIC_INDEX, faiss.IndexIVF):
+        _update_vector_index(SEMANTIC_INDEX, SEMANTIC_TEXTS, texts, corpus_key)
+    else:
+        SEMANTIC_INDEX = _build_vector_index(_embed_cached(texts), corpus_key)
+    
+    _SEMANTIC_IDS.update(ids)
+    SEMANTIC_ITEMS, SEMANTIC_TEXTS = items, texts
+
+_build_semantic_index()
+
 # ============================================================================
 # TOOLS: Organized by Intent
 # ============================================================================
 
 # SEARCH TOOLS (find information)
+# Results (including misses) are memoized per normalized query, since ReAct often
+# retries the same search; the update_* setters below clear these caches
+@functools.lru_cache(maxsize=256)
+def _search_jira_hits(query_lower: str) -> tuple:
+    hits = _token_hits(JIRA_INDEX, query_lower)
+    rows = sorted(TICKET_ID_TO_IDX[t] for t in hits) if hits else _scan_jira(query_lower)
+    return tuple(_JIRA_RESULT_LINES[i] for i in rows)
+
+@functools.lru_cache(maxsize=256)
+def _search_confluence_hits(query_lower: str) -> tuple:
+    return tuple(
+        _CONFLUENCE_RESULT_LINES[doc_id]
+        for doc_id in _lookup(CONFLUENCE_INDEX, _CONFLUENCE_SEARCH_ROWS, _CONFLUENCE_CORPUS, query_lower)
+    )
+
 def search_jira(query: str) -> str:
     """Search Jira tickets by keyword."""
-    query_lower = query.lower()
-    results = []
-    
-    for ticket_id, ticket in JIRA_TICKETS.items():
-        if (query_lower in ticket["title"].lower() or 
-            query_lower in ticket["description"].lower() or
-            query_lower in ticket["priority"].lower() or
-            query_lower in ticket["status"].lower() or
-            query_lower in ticket["assignee"].lower()):
-            results.append(
-                f"{ticket_id}: {ticket['title']} "
-                f"(Status: {ticket['status']}, Priority: {ticket['priority']}, "
-                f"Assignee: {ticket['assignee']})"
-            )
+    results = _search_jira_hits(query.strip().lower())
     
     if not results:
         return f"No Jira tickets found matching '{query}'"
@@ -140,83 +508,141 @@ def search_jira(query: str) -> str:
 
 def search_confluence(query: str) -> str:
     """Search Confluence documentation."""
-    query_lower = query.lower()
-    results = []
-    
-    for doc_id, doc in CONFLUENCE_DOCS.items():
-        if (query_lower in doc["title"].lower() or 
-            query_lower in doc["content"].lower()):
-            results.append(f"• {doc['title']} (Key: {doc_id}, Updated: {doc['updated']})")
+    results = _search_confluence_hits(query.strip().lower())
     
     if not results:
         return f"No Confluence docs found matching '{query}'"
     
     return f"Found {len(results)} document(s):\n" + "\n".join(results)
 
-# RETRIEVE TOOLS (get specific items)
-def get_ticket_details(ticket_id: str) -> str:
-    """Get full details for a specific Jira ticket."""
-    ticket = JIRA_TICKETS.get(ticket_id.upper())
+search_jira.cache_clear = _search_jira_hits.cache_clear
+search_confluence.cache_clear = _search_confluence_hits.cache_clear
+
+def semantic_search(query: str, k: int = 5) -> str:
+    """Search Jira tickets and Confluence docs by meaning rather than exact keywords."""
+    query_emb = EMBEDDING_MODEL.encode([query], normalize_embeddings=True).astype(np.float32)
+    k = max(1, min(k, SEMANTIC_INDEX.ntotal))  # faiss asserts k > 0
+    scores, ids = SEMANTIC_INDEX.search(query_emb, k)
     
-    if not ticket:
-        return f"Ticket {ticket_id} not found"
+    results = [
+        f"{SEMANTIC_ITEMS[i]} [score: {score:.2f}]"
+        for score, i in zip(scores[0], ids[0]) if i != -1
+    ]
+    
+    if not results:
+        return f"No semantically related items found for '{query}'"
     
-    return f"""Ticket {ticket_id}: {ticket['title']}
-Status: {ticket['status']}
-Assignee: {ticket['assignee']}
-Priority: {ticket['priority']}
-Created: {ticket['created']}
-Updated: {ticket['updated']}
+    return f"Found {len(results)} related item(s):\n" + "\n".join(results)
 
-Description:
-{ticket['description']}"""
+# RETRIEVE TOOLS (get specific items)
+def get_ticket_details(ticket_id: str) -> str:
+    """Get full details for a specific Jira ticket."""
+    detail = _TICKET_DETAIL_CACHE.get(ticket_id.upper())
+    return detail if detail is not None else f"Ticket {ticket_id} not found"
 
 def get_confluence_doc(doc_key: str) -> str:
     """Get full content of a Confluence document."""
-    doc = CONFLUENCE_DOCS.get(doc_key)
-    
-    if not doc:
-        return f"Document '{doc_key}' not found. Available keys: {', '.join(CONFLUENCE_DOCS.keys())}"
-    
-    return f"""{doc['title']}
-Last updated: {doc['updated']}
-
-Content:
-{doc['content']}"""
+    detail = _DOC_DETAIL_CACHE.get(doc_key)
+    return detail if detail is not None else f"Document '{doc_key}' not found. Available keys: {_DOC_KEYS_CSV}"
 
 # ANALYZE TOOLS (metrics and trends)
 def get_metric(metric_name: str) -> str:
     """Get current value and trend for a specific metric."""
-    metric = ANALYTICS_DATA.get(metric_name)
-    
-    if not metric:
-        available = ', '.join(ANALYTICS_DATA.keys())
-        return f"Metric '{metric_name}' not found. Available: {available}"
-    
-    return f"""{metric_name}:
-Current: {metric['current']}
-Previous: {metric['previous']}
-Trend: {metric['trend']} ({metric['change_pct']:+.1f}%)
-Period: {metric['period']}"""
+    formatted = _METRIC_FORMATTED.get(metric_name)
+    return formatted if formatted is not None else f"Metric '{metric_name}' not found. Available: {_METRIC_NAMES_CSV}"
 
 def compare_metrics(metric_a: str, metric_b: str) -> str:
     """Compare two metrics side by side."""
-    data_a = ANALYTICS_DATA.get(metric_a)
-    data_b = ANALYTICS_DATA.get(metric_b)
+    summary_a = _METRIC_SUMMARY.get(metric_a)
+    summary_b = _METRIC_SUMMARY.get(metric_b)
     
-    if not data_a or not data_b:
+    if summary_a is None or summary_b is None:
         return f"One or both metrics not found: {metric_a}, {metric_b}"
     
-    return f"""Comparison:
-{metric_a}: {data_a['current']} ({data_a['trend']} {data_a['change_pct']:+.1f}%)
-{metric_b}: {data_b['current']} ({data_b['trend']} {data_b['change_pct']:+.1f}%)"""
+    return "\n".join(["Comparison:", f"{metric_a}: {summary_a}", f"{metric_b}: {summary_b}"])
+
+def analyze_metrics(names: List[str]) -> str:
+    """Analyze the trends of several metrics at once and flag the largest drop."""
+    if isinstance(names, str):
+        names = [names]
+    
+    mask = np.isin(_METRIC_NAMES, names)
+    unknown = [name for name in names if name not in ANALYTICS_DATA]
+    if not mask.any():
+        return f"None of the metrics were found: {', '.join(names)}. Available: {_METRIC_NAMES_CSV}"
+    
+    selected = _METRIC_NAMES[mask]
+    current, previous = _CURRENT[mask], _PREVIOUS[mask]
+    pct = (current - previous) / previous * 100
+    
+    lines = ["Metrics analysis:"] + [
+        f"• {name}: {float(cur):g} vs {float(prev):g} ({float(p):+.1f}%)"
+        for name, cur, prev, p in zip(selected, current, previous, pct)
+    ]
+    worst = int(np.argmin(pct))
+    if pct[worst] < 0:
+        lines.append(f"Largest drop: {selected[worst]} ({float(pct[worst]):+.1f}%)")
+    else:
+        lines.append("No metric declined")
+    if unknown:
+        lines.append(f"Not found: {', '.join(unknown)}")
+    return "\n".join(lines)
 
 def list_available_metrics() -> str:
     """List all available metrics."""
-    metrics = []
-    for name, data in ANALYTICS_DATA.items():
-        metrics.append(f"• {name}: {data['current']} ({data['trend']} {data['change_pct']:+.1f}%)")
-    return "Available metrics:\n" + "\n".join(metrics)
+    return _METRICS_LIST_STR
+
+# DATA UPDATES (keep the precomputed caches in sync with the mock stores)
+def _merged_record(store: Dict[str, Dict[str, Any]], key: str, fields: Dict[str, Any], schema: Dict[str, Any]):
+    unknown = fields.keys() - schema.keys()
+    if unknown:
+        raise ValueError(f"'{key}' has unknown fields: {', '.join(sorted(unknown))}")
+    for name, value in fields.items():
+        if isinstance(value, bool) or not isinstance(value, schema[name]):
+            raise TypeError(f"'{key}' field '{name}' has invalid type {type(value).__name__}")
+    
+    record = {**store.get(key, {}), **fields}
+    missing = schema.keys() - record.keys()
+    if missing:
+        raise ValueError(f"'{key}' is missing fields: {', '.join(sorted(missing))}")
+    return record
+
+def _commit_record(store: Dict[str, Dict[str, Any]], key: str, record: Dict[str, Any], *rebuilds):
+    """Store the record and run the rebuilds; on failure restore the old entry and caches."""
+    previous = store.get(key)
+    store[key] = record
+    try:
+        for rebuild in rebuilds:
+            rebuild()
+    except Exception:
+        if previous is None:
+            del store[key]
+        else:
+            store[key] = previous
+        for rebuild in rebuilds:
+            rebuild()
+        raise
+
+def update_ticket(ticket_id: str, **fields):
+    """Create or update a Jira ticket, then rebuild every cache derived from the tickets."""
+    ticket_id = ticket_id.upper()
+    record = _merged_record(JIRA_TICKETS, ticket_id, fields, JIRA_FIELDS)
+    _commit_record(JIRA_TICKETS, ticket_id, record, _build_jira_store, _build_semantic_index)
+    search_jira.cache_clear()
+    CachedModule.clear_all()  # cached answers may quote the old ticket
+
+def update_doc(doc_key: str, **fields):
+    """Create or update a Confluence doc, then rebuild every cache derived from the docs."""
+    record = _merged_record(CONFLUENCE_DOCS, doc_key, fields, CONFLUENCE_FIELDS)
+    _commit_record(CONFLUENCE_DOCS, doc_key, record, _build_confluence_store, _build_semantic_index)
+    search_confluence.cache_clear()
+    CachedModule.clear_all()
+
+def update_metric(metric_name: str, **fields):
+    """Create or update a metric, then rebuild the metric display caches."""
+    record = _merged_record(ANALYTICS_DATA, metric_name, fields, METRIC_FIELDS)
+    _commit_record(ANALYTICS_DATA, metric_name, record, _build_metric_store)
+    CachedModule.clear_all()
 
 print("✓ Tools defined\n")
 
@@ -224,38 +650,141 @@ print("✓ Tools defined\n")
 # PLAN STEP SCHEMA
 # ============================================================================
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PlanStep:
     """A single step in an execution plan."""
     subquery: str
     intent: str  # search, retrieve, or analyze
+    depends_on: tuple = ()  # indices of earlier steps whose answers this step needs
     
     def __repr__(self):
-        return f"[{self.intent}] {self.subquery}"
+        deps = f" (after step {', '.join(map(str, self.depends_on))})" if self.depends_on else ""
+        return f"[{self.intent}] {self.subquery}{deps}"
+
+@dataclass(slots=True, frozen=True)
+class StepResult:
+    """The answer produced for one plan step."""
+    step_id: int
+    step: PlanStep
+    answer: str
 
 # ============================================================================
 # SPECIALIZED AGENTS BY INTENT
 # ============================================================================
 
+TICKET_ID_PATTERN = re.compile(r"\b(SHOP-\d{3,5})\b", re.IGNORECASE)
+# Wording that asks for reasoning on top of the raw record, which the agent must do
+REASONING_CUES = re.compile(
+    r"\b(compar\w*|vs|versus|than|usual|why|cause\w*|explain\w*|impact\w*|affect\w*|"
+    r"relat\w*|correlat\w*|worse|better|should)\b",
+    re.IGNORECASE,
+)
+
+def _is_plain_lookup(question: str, context: str) -> bool:
+    """True when the question stands alone and only asks to see a record."""
+    return not context.strip() and not REASONING_CUES.search(question)
+
+def _named_records(question: str):
+    """Ticket IDs and Confluence doc keys spelled out in the question."""
+    ticket_ids = {m.upper() for m in TICKET_ID_PATTERN.findall(question)}
+    doc_keys = [key for key in CONFLUENCE_DOCS if key in question]
+    return ticket_ids, doc_keys
+
+def _named_metrics(question: str) -> List[str]:
+    """Known metric names mentioned in the question, with or without underscores."""
+    question_lower = question.lower()
+    return [
+        name for name in ANALYTICS_DATA
+        if name in question_lower or name.replace("_", " ") in question_lower
+    ]
+
+def _count_records(question: str) -> int:
+    ticket_ids, doc_keys = _named_records(question)
+    return len(ticket_ids) + len(doc_keys)
+
+def _count_metrics(question: str) -> int:
+    return len(_named_metrics(question))
+
+def _iter_budget(named: int, cap: int) -> int:
+    """ReAct turns for a question: one per named item plus one to finish, up to `cap`.
+    
+    Questions that name nothing (the items come from context or a search) keep the cap.
+    """
+    return min(cap, named + 1) if named else cap
+
+def _retrieve_fast_path(question: str, context: str = ""):
+    """Fetch the item directly when a plain lookup names exactly one ticket or doc key."""
+    if not _is_plain_lookup(question, context):
+        return None
+    
+    ticket_ids, doc_keys = _named_records(question)
+    if len(ticket_ids) == 1 and not doc_keys:
+        return get_ticket_details(ticket_ids.pop())
+    if len(doc_keys) == 1 and not ticket_ids:
+        return get_confluence_doc(doc_keys[0])
+    return None
+
+def _analyze_fast_path(question: str, context: str = ""):
+    """Read the metric directly when a plain lookup mentions exactly one known metric."""
+    if not _is_plain_lookup(question, context):
+        return None
+    
+    mentioned = _named_metrics(question)
+    return get_metric(mentioned[0]) if len(mentioned) == 1 else None
+
+def _run_batch(
+    agent: dspy.Module, questions: List[str], context: str = "", fast_path=None, count_items=None
+) -> dspy.Prediction:
+    """Answer several subqueries in one ReAct context, falling back to one call per question."""
+    answers = [fast_path(q, context) if fast_path else None for q in questions]
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    
+    if len(pending) == 1:
+        answers[pending[0]] = agent(question=questions[pending[0]], context=context).answer
+    elif pending:
+        max_iters = agent.batch_react.max_iters
+        counts = [count_items(questions[i]) for i in pending] if count_items else []
+        if counts and all(counts):
+            max_iters = _iter_budget(sum(counts), max_iters)
+        result = agent.batch_react(
+            questions=[questions[i] for i in pending],
+            context=context or "No previous context",
+            max_iters=max_iters,
+        )
+        batch = list(result.answers or [])
+        if len(batch) != len(pending):
+            batch = [agent(question=questions[i], context=context).answer for i in pending]
+        for i, answer in zip(pending, batch):
+            answers[i] = answer
+    
+    return dspy.Prediction(answers=answers)
+
 class SearchQuery(dspy.Signature):
     """Search for relevant information in Jira tickets and Confluence docs."""
     question: str = dspy.InputField()
     context: str = dspy.InputField(desc="Results from previous steps (if any)")
     answer: str = dspy.OutputField(desc="Summary of search results")
 
+class BatchedSearchQuery(dspy.Signature):
+    """Search for relevant information in Jira tickets and Confluence docs, answering each question separately."""
+    questions: List[str] = dspy.InputField()
+    context: str = dspy.InputField(desc="Results from previous steps (if any)")
+    answers: List[str] = dspy.OutputField(desc="One answer per question, in the same order")
+
 class SearchAgent(dspy.Module):
     """Specialized agent for searching (finding information)."""
     def __init__(self):
         super().__init__()
-        self.react = dspy.ReAct(
-            signature=SearchQuery,
-            tools=[search_jira, search_confluence],
-            max_iters=4
-        )
+        tools = [search_jira, search_confluence, semantic_search]
+        self.react = dspy.ReAct(signature=SearchQuery, tools=tools, max_iters=4)
+        self.batch_react = dspy.ReAct(signature=BatchedSearchQuery, tools=tools, max_iters=8)
     
     def forward(self, question: str, context: str = ""):
         result = self.react(question=question, context=context or "No previous context")
         return dspy.Prediction(answer=result.answer)
+    
+    def forward_batch(self, questions: List[str], context: str = ""):
+        return _run_batch(self, questions, context)
 
 class RetrieveQuery(dspy.Signature):
     """Retrieve detailed information for specific tickets or documents."""
@@ -263,19 +792,35 @@ class RetrieveQuery(dspy.Signature):
     context: str = dspy.InputField(desc="Results from previous steps (if any)")
     answer: str = dspy.OutputField(desc="Detailed information from retrieved items")
 
+class BatchedRetrieveQuery(dspy.Signature):
+    """Retrieve detailed information for specific tickets or documents, answering each question separately."""
+    questions: List[str] = dspy.InputField()
+    context: str = dspy.InputField(desc="Results from previous steps (if any)")
+    answers: List[str] = dspy.OutputField(desc="One answer per question, in the same order")
+
 class RetrieveAgent(dspy.Module):
     """Specialized agent for retrieving (getting specific items by ID)."""
     def __init__(self):
         super().__init__()
-        self.react = dspy.ReAct(
-            signature=RetrieveQuery,
-            tools=[get_ticket_details, get_confluence_doc],
-            max_iters=3
-        )
+        tools = [get_ticket_details, get_confluence_doc]
+        self.react = dspy.ReAct(signature=RetrieveQuery, tools=tools, max_iters=3)
+        self.batch_react = dspy.ReAct(signature=BatchedRetrieveQuery, tools=tools, max_iters=6)
     
     def forward(self, question: str, context: str = ""):
-        result = self.react(question=question, context=context or "No previous context")
+        # Skip the ReAct loop when a single tool call answers a standalone lookup
+        answer = _retrieve_fast_path(question, context)
+        if answer is not None:
+            return dspy.Prediction(answer=answer)
+        
+        result = self.react(
+            question=question,
+            context=context or "No previous context",
+            max_iters=_iter_budget(_count_records(question), self.react.max_iters),
+        )
         return dspy.Prediction(answer=result.answer)
+    
+    def forward_batch(self, questions: List[str], context: str = ""):
+        return _run_batch(self, questions, context, fast_path=_retrieve_fast_path, count_items=_count_records)
 
 class AnalyzeQuery(dspy.Signature):
     """Analyze metrics, trends, and data patterns."""
@@ -283,22 +828,119 @@ class AnalyzeQuery(dspy.Signature):
     context: str = dspy.InputField(desc="Results from previous steps (if any)")
     answer: str = dspy.OutputField(desc="Analysis with trends and insights")
 
+class BatchedAnalyzeQuery(dspy.Signature):
+    """Analyze metrics, trends, and data patterns, answering each question separately."""
+    questions: List[str] = dspy.InputField()
+    context: str = dspy.InputField(desc="Results from previous steps (if any)")
+    answers: List[str] = dspy.OutputField(desc="One answer per question, in the same order")
+
 class AnalyzeAgent(dspy.Module):
     """Specialized agent for analyzing (metrics and trends)."""
     def __init__(self):
         super().__init__()
-        self.react = dspy.ReAct(
-            signature=AnalyzeQuery,
-            tools=[get_metric, compare_metrics, list_available_metrics],
-            max_iters=4
-        )
+        tools = [get_metric, compare_metrics, analyze_metrics, list_available_metrics]
+        self.react = dspy.ReAct(signature=AnalyzeQuery, tools=tools, max_iters=4)
+        self.batch_react = dspy.ReAct(signature=BatchedAnalyzeQuery, tools=tools, max_iters=8)
     
     def forward(self, question: str, context: str = ""):
-        result = self.react(question=question, context=context or "No previous context")
+        # Skip the ReAct loop when a single tool call answers a standalone lookup
+        answer = _analyze_fast_path(question, context)
+        if answer is not None:
+            return dspy.Prediction(answer=answer)
+        
+        result = self.react(
+            question=question,
+            context=context or "No previous context",
+            max_iters=_iter_budget(_count_metrics(question), self.react.max_iters),
+        )
         return dspy.Prediction(answer=result.answer)
+    
+    def forward_batch(self, questions: List[str], context: str = ""):
+        return _run_batch(self, questions, context, fast_path=_analyze_fast_path, count_items=_count_metrics)
 
 print("✓ Specialized agents initialized\n")
 
+# ============================================================================
+# RESULT CACHE: Skip the LLM roundtrip for repeated (question, context) pairs
+# ============================================================================
+
+class CachedModule(dspy.Module):
+    """Memoize a module's Prediction keyed by (question, hash of the other inputs).
+    
+    Evicts in FIFO order once `maxsize` entries are stored. Live instances are tracked
+    so that clear_all() can drop every cached answer when the underlying data changes.
+    `on_miss(question, result, **inputs)` runs only for freshly computed predictions.
+    """
+    _instances: "weakref.WeakSet[CachedModule]" = weakref.WeakSet()
+    
+    def __init__(
+        self,
+        module: dspy.Module,
+        maxsize: int = 512,
+        normalize_question: bool = False,
+        on_miss: Optional[Callable[..., None]] = None,
+    ):
+        super().__init__()
+        self.module = module
+        self.maxsize = maxsize
+        self.normalize_question = normalize_question
+        self.on_miss = on_miss
+        self._cache: Dict[tuple, dspy.Prediction] = {}
+        self._lock = threading.Lock()
+        CachedModule._instances.add(self)
+    
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+    
+    @classmethod
+    def clear_all(cls):
+        """Clear every live CachedModule, e.g. after a ticket, doc or metric changes."""
+        for cached in list(cls._instances):
+            cached.clear()
+    
+    def _key(self, question: str, inputs: Dict[str, Any]) -> tuple:
+        if self.normalize_question:
+            question = question.strip().lower()
+        context = "\x1f".join(f"{name}={value}" for name, value in sorted(inputs.items()))
+        return (question, hashlib.blake2b(context.encode(), digest_size=16).hexdigest())
+    
+    def _store(self, key: tuple, result: dspy.Prediction, question: str, inputs: Dict[str, Any]):
+        with self._lock:
+            if key not in self._cache and len(self._cache) >= self.maxsize:
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = result
+        if self.on_miss is not None:
+            self.on_miss(question, result, **inputs)
+    
+    def forward(self, question: str, **inputs):
+        key = self._key(question, inputs)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self.module(question=question, **inputs)
+        self._store(key, result, question, inputs)
+        return result
+    
+    def forward_batch(self, questions: List[str], **inputs):
+        """Answer cached questions directly and send only the misses to the wrapped batch call."""
+        keys = [self._key(q, inputs) for q in questions]
+        with self._lock:
+            hits = [self._cache.get(key) for key in keys]
+        misses = [i for i, hit in enumerate(hits) if hit is None]
+        
+        if len(misses) == 1:
+            hits[misses[0]] = self(question=questions[misses[0]], **inputs)
+        elif misses:
+            batch = self.module.forward_batch(questions=[questions[i] for i in misses], **inputs)
+            for i, answer in zip(misses, batch.answers):
+                hits[i] = dspy.Prediction(answer=answer)
+                self._store(keys[i], hits[i], questions[i], inputs)
+        
+        return dspy.Prediction(answers=[hit.answer for hit in hits])
+
 # ============================================================================
 # ORCHESTRATOR WITH INTENT-BASED ROUTING
 # ============================================================================
@@ -314,19 +956,144 @@ class QueryPlanning(dspy.Signature):
     question: str = dspy.InputField()
     available_intents: str = dspy.InputField()
     plan: List[dict] = dspy.OutputField(
-        desc="List of dicts with keys: subquery (str), intent (str: search/retrieve/analyze)"
+        desc="List of dicts with keys: subquery (str), intent (str: search/retrieve/analyze), "
+             "depends_on (optional list of earlier step indices whose results this step needs)"
     )
 
+def _parse_depends_on(raw, step_index: int) -> tuple:
+    """Keep only valid references to earlier steps."""
+    deps = []
+    for d in raw if isinstance(raw, (list, tuple)) else []:
+        try:
+            d = int(d)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= d < step_index and d not in deps:
+            deps.append(d)
+    return tuple(deps)
+
+def _group_into_waves(steps: List[PlanStep]) -> List[List[int]]:
+    """Group step indices into waves whose dependencies are all resolved by earlier waves."""
+    levels = []
+    for step in steps:
+        levels.append(max((levels[d] + 1 for d in step.depends_on), default=0))
+    
+    waves = [[] for _ in range(max(levels, default=-1) + 1)]
+    for i, level in enumerate(levels):
+        waves[level].append(i)
+    return waves
+
+BATCH_TOKEN_BUDGET = 2000  # rough prompt tokens (chars // 4) allowed for one batched call
+CONTEXT_TOKEN_LIMIT = 2000  # rough tokens (chars // 4) above which context is summarized
+
+def _group_batches(steps: List[PlanStep], wave: List[int]) -> List[List[int]]:
+    """Coalesce consecutive steps in a wave that share an intent and dependencies."""
+    groups = []
+    for i in wave:
+        prev = steps[groups[-1][-1]] if groups else None
+        if prev and (prev.intent, prev.depends_on) == (steps[i].intent, steps[i].depends_on):
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+# Fast-path router: a question matching exactly one intent skips the LLM planner
+INTENT_RULES = [
+    (re.compile(r"\bSHOP-\d+\b|\bget\b.*\bdetails\b", re.IGNORECASE), "retrieve"),
+    (re.compile(r"\b(?:trend\w*|conversions?|metrics?|rates?|compare)\b", re.IGNORECASE), "analyze"),
+    (re.compile(r"\b(?:find|search|which|what tickets|mention\w*|issues?)\b", re.IGNORECASE), "search"),
+]
+
+def _route_by_rules(question: str) -> Optional[str]:
+    """Return the intent if exactly one rule matches, else None.
+    
+    Retrieve is only routed directly when the question names a ticket ID or doc key;
+    "get details for the most critical ticket" must be found first, so the planner
+    gets it and can plan search -> retrieve.
+    """
+    matched = {intent for pattern, intent in INTENT_RULES if pattern.search(question)}
+    if len(matched) != 1:
+        return None
+    intent = matched.pop()
+    if intent == "retrieve" and not _count_records(question):
+        return None
+    return intent
+
+STREAM_COALESCE_WINDOW = 0.01  # seconds; events arriving this close together are flushed together
+
+async def _drain(stream) -> list:
+    return [event async for event in stream]
+
+async def coalesce_events(stream, window: float = STREAM_COALESCE_WINDOW):
+    """Re-yield a stream's events as lists, merging events that arrive within `window` seconds."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    
+    async def pump():
+        try:
+            async for event in stream:
+                await queue.put(event)
+        finally:
+            await queue.put(done)
+    
+    pump_task = asyncio.ensure_future(pump())
+    finished = False
+    while not finished:
+        event = await queue.get()
+        if event is done:
+            break
+        
+        # Give concurrently finishing steps a moment to land, then flush everything ready
+        batch = [event]
+        await asyncio.sleep(window)
+        while not queue.empty():
+            event = queue.get_nowait()
+            if event is done:
+                finished = True
+                break
+            batch.append(event)
+        yield batch
+    
+    await pump_task
+
+def _run_sync(coro):
+    """Run a coroutine to completion, even if called from inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+# Planner distillation: plans are logged as traces, compiled by compile_planner, and loaded on startup
+PLANNER_PATH = "planner.json"
+PLANNER_TRACES_PATH = "planner_traces.jsonl"
+_trace_lock = threading.Lock()
+
+def _log_plan_trace(question: str, result: dspy.Prediction, available_intents: str):
+    """Append a freshly generated plan to the distillation traces (cache hits are not logged)."""
+    record = {"question": question, "available_intents": available_intents, "plan": result.plan}
+    with _trace_lock, open(PLANNER_TRACES_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
 class ScoutOrchestrator(dspy.Module):
     def __init__(self):
         super().__init__()
-        self.planner = dspy.ChainOfThought(QueryPlanning)
+        # No ChainOfThought: nothing downstream reads the rationale, so skip generating it
+        planner = dspy.Predict(QueryPlanning)
+        if os.path.exists(PLANNER_PATH):
+            planner.load(PLANNER_PATH)
+        if PLANNER_LM is not None:
+            planner.set_lm(PLANNER_LM)
+        self.planner = CachedModule(planner, normalize_question=True, on_miss=_log_plan_trace)
+        self.summarizer = dspy.Predict("prior_context -> compressed_context")
         
         # Intent-based agent registry
         self.agents = {
-            "search": SearchAgent(),
-            "retrieve": RetrieveAgent(),
-            "analyze": AnalyzeAgent(),
+            "search": CachedModule(SearchAgent()),
+            "retrieve": CachedModule(RetrieveAgent()),
+            "analyze": CachedModule(AnalyzeAgent()),
         }
         
         # Intent descriptions for planner
@@ -341,9 +1108,62 @@ Examples:
 - "Get details for SHOP-2847" → retrieve
 - "Are mobile conversions down?" → analyze
 - "Find checkout issues and check if conversions dropped" → search (find issues), analyze (check metrics)
+- "Find P0 tickets and get details for the most critical one" → search, retrieve (depends_on: [0])
+
+Only set depends_on when a step needs an earlier step's results; steps without it run in parallel.
         """.strip()
     
     def forward(self, question: str):
+        return _run_sync(self.aforward(question))
+    
+    async def aforward(self, question: str):
+        # Drain the step stream; every step yields exactly one StepResult
+        return self.synthesize(await _drain(self.forward_stream(question)))
+    
+    def synthesize(self, step_results: List[StepResult]) -> dspy.Prediction:
+        """Combine a query's StepResults into the final prediction."""
+        step_results = sorted(step_results, key=lambda sr: sr.step_id)
+        steps = [sr.step for sr in step_results]
+        
+        # Synthesize final answer
+        if len(step_results) == 1:
+            final_answer = step_results[0].answer
+        else:
+            answers = []
+            for sr in step_results:
+                intent_label = sr.step.intent.upper()
+                answers.append(f"**{intent_label}**: {sr.answer}")
+            final_answer = "\n\n".join(answers)
+        
+        return dspy.Prediction(
+            answer=final_answer,
+            plan=steps,
+            step_results=step_results
+        )
+    
+    async def forward_stream(self, question: str):
+        """Yield a StepResult as soon as each step completes."""
+        steps = await dspy.asyncify(self._plan)(question)
+        answers = {}
+        
+        # Execute steps wave by wave, routing each to its intent-specific agent
+        for wave in _group_into_waves(steps):
+            tasks = [
+                asyncio.ensure_future(self._execute_tagged(steps, group, answers))
+                for group in _group_batches(steps, wave)
+            ]
+            for next_done in asyncio.as_completed(tasks):
+                group, group_answers = await next_done
+                for i, answer in zip(group, group_answers):
+                    answers[i] = answer
+                    yield StepResult(i, steps[i], answer)
+    
+    def _plan(self, question: str) -> List[PlanStep]:
+        # Obvious single-intent questions don't need a plan
+        intent = _route_by_rules(question)
+        if intent is not None:
+            return [PlanStep(subquery=question, intent=intent)]
+        
         # Generate plan
         plan_result = self.planner(
             question=question,
@@ -361,7 +1181,8 @@ Examples:
             
             steps.append(PlanStep(
                 subquery=step_dict.get("subquery", question),
-                intent=intent
+                intent=intent,
+                depends_on=_parse_depends_on(step_dict.get("depends_on"), len(steps))
             ))
         
         # Fallback if empty plan
@@ -369,38 +1190,72 @@ Examples:
             print("⚠️  Empty plan returned, using fallback")
             steps = [PlanStep(subquery=question, intent="search")]
         
-        # Execute each step by routing to intent-specific agent
-        step_results = []
-        accumulated_context = ""
+        return steps
+    
+    async def _execute_tagged(self, steps: List[PlanStep], group: List[int], answers: Dict[int, str]):
+        return group, await self._execute_group(steps, group, answers)
+    
+    async def _execute_group(self, steps: List[PlanStep], group: List[int], answers: Dict[int, str]) -> List[str]:
+        """Run a group of same-intent steps as one batched call, or per step if it is too large."""
+        agent = self.agents[steps[group[0]].intent]
+        context = self._context_for(steps, steps[group[0]], answers)
+        if len(context) // 4 > CONTEXT_TOKEN_LIMIT:
+            summary = await dspy.asyncify(self.summarizer)(prior_context=context)
+            context = summary.compressed_context
+        questions = [steps[i].subquery for i in group]
         
-        for i, step in enumerate(steps):
-            agent = self.agents[step.intent]
-            result = agent(question=step.subquery, context=accumulated_context)
-            step_results.append({
-                "step_id": i,
-                "step": step,
-                "answer": result.answer
-            })
-            
-            # Build context for next step
-            accumulated_context += f"\nStep {i} ({step.intent}): {result.answer}\n"
+        est_tokens = (sum(len(q) for q in questions) + len(context)) // 4
+        if len(group) > 1 and est_tokens <= BATCH_TOKEN_BUDGET:
+            result = await dspy.asyncify(agent.forward_batch)(questions=questions, context=context)
+            return result.answers
         
-        # Synthesize final answer
-        if len(step_results) == 1:
-            final_answer = step_results[0]["answer"]
-        else:
-            answers = []
-            for sr in step_results:
-                intent_label = sr['step'].intent.upper()
-                answers.append(f"**{intent_label}**: {sr['answer']}")
-            final_answer = "\n\n".join(answers)
+        results = await asyncio.gather(*[
+            dspy.asyncify(agent)(question=q, context=context) for q in questions
+        ])
+        return [result.answer for result in results]
+    
+    def _context_for(self, steps: List[PlanStep], step: PlanStep, answers: Dict[int, str]) -> str:
+        """Build context from the answers of every step this step declares it depends on.
         
-        return dspy.Prediction(
-            answer=final_answer,
-            plan=steps,
-            step_results=step_results
+        Undeclared steps are already left out; oversized context is summarized by the caller.
+        """
+        return "".join(
+            f"\nStep {d} ({steps[d].intent}): {answers[d]}\n"
+            for d in sorted(step.depends_on)
         )
 
+def _same_intents(example, pred, trace=None) -> bool:
+    """A distilled plan is correct if it routes to the same sequence of intents."""
+    intents = lambda plan: [str(step.get("intent", "")).lower() for step in plan or []]
+    return intents(example.plan) == intents(pred.plan)
+
+def compile_planner(traces_path: str = PLANNER_TRACES_PATH, out_path: str = PLANNER_PATH):
+    """Distill logged (question -> plan) traces into a few-shot Predict planner.
+    
+    Demos are bootstrapped by a teacher Predict on the main LM; the compiled student is
+    bound to PLANNER_LM when one is configured, and the saved planner is loaded by
+    ScoutOrchestrator on startup.
+    """
+    with open(traces_path) as f:
+        traces = {t["question"]: t for t in map(json.loads, f)}  # latest plan per question
+    
+    trainset = [
+        dspy.Example(**t).with_inputs("question", "available_intents")
+        for t in traces.values()
+    ]
+    optimizer = dspy.BootstrapFewShot(
+        metric=_same_intents,
+        max_bootstrapped_demos=4,
+        max_labeled_demos=16,
+    )
+    # A separate teacher: BootstrapFewShot otherwise copies the student, LM binding and all
+    teacher = dspy.Predict(QueryPlanning)
+    compiled = optimizer.compile(dspy.Predict(QueryPlanning), teacher=teacher, trainset=trainset)
+    compiled.save(out_path)  # before set_lm, so the file holds demos but no serialized LM
+    if PLANNER_LM is not None:
+        compiled.set_lm(PLANNER_LM)
+    return compiled
+
 print("✓ Orchestrator initialized\n")
 
 
@@ -438,13 +1293,45 @@ print("=" * 80)
 print("SCOUT TEST QUERIES - Intent-Based Routing")
 print("=" * 80)
 
-for i, query in enumerate(test_queries, 1):
+MAX_CONCURRENT_QUERIES = 4  # enough to overlap LLM latency without tripping provider 429s
+
+# Words that usually introduce another plan step; more matches -> more steps -> slower query
+COST_KEYWORDS = re.compile(r"\b(?:find|get|check|search|compare|and)\b", re.IGNORECASE)
+
+def estimate_cost(query: str) -> int:
+    return len(COST_KEYWORDS.findall(query))
+
+async def run_queries(queries: List[str]):
+    """Run queries on MAX_CONCURRENT_QUERIES workers, cheapest first; returns (query, result) in input order.
+    
+    Step completions are printed as they stream in, coalesced so that steps finishing
+    together share one progress line.
+    """
+    queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+    for i, query in enumerate(queries):
+        queue.put_nowait((estimate_cost(query), i, query))
+    
+    results = [None] * len(queries)
+    
+    # Consume the step stream on this loop: wrapping the sync forward in asyncify would
+    # start a nested loop per query whose agent threads compete for the same limiter
+    async def worker():
+        while not queue.empty():
+            _, i, query = queue.get_nowait()
+            step_results = []
+            async for finished in coalesce_events(scout.forward_stream(query)):
+                step_results.extend(finished)
+                print(f"   ⏳ Query {i + 1}: step(s) {', '.join(str(sr.step_id) for sr in finished)} done")
+            results[i] = (query, scout.synthesize(step_results))
+    
+    await asyncio.gather(*(worker() for _ in range(MAX_CONCURRENT_QUERIES)))
+    return results
+
+for i, (query, result) in enumerate(_run_sync(run_queries(test_queries)), 1):
     print(f"\n{'='*80}")
     print(f"Query {i}: {query}")
     print("=" * 80)
     
-    result = scout(question=query)
-    
     print("\n📋 EXECUTION PLAN:")
     for j, step in enumerate(result.plan):
         print(f"   Step {j}: {step}")
@@ -614,4 +1501,3 @@ These trends suggest that the Safari checkout issue is impacting user engagement
 ✓ All test queries complete!
 ================================================================================
 """
-`